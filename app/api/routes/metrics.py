@@ -0,0 +1,23 @@
+from fastapi import APIRouter
+from app.services.moderation import get_moderation_stats
+from app.services.usage import get_usage_stats
+
+router = APIRouter(prefix="/api/metrics", tags=["Metrics"])
+
+
+@router.get("/moderation", summary="Moderation tier counters")
+async def moderation_metrics():
+    """
+    Retrieve how many products each moderation tier decided and how many
+    remote moderation calls the local tier saved, across all workers.
+    """
+    return get_moderation_stats()
+
+
+@router.get("/usage", summary="Mistral token usage")
+async def usage_metrics():
+    """
+    Retrieve Mistral call counts, token usage and latency per endpoint,
+    across all workers.
+    """
+    return get_usage_stats()
@@ -1,22 +1,47 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Optional
 from bson import ObjectId
-from app.db.crud.product import add_product, get_all_products, get_product_by_id, update_product, delete_product
-from app.db.models.product import AddProduct, GetProduct
+from app.db.crud.product import add_product, get_all_products, get_product_by_id, update_product, delete_product, find_duplicate_products, find_similar_products, build_product_filter
+from app.db.crud.facets import get_product_facets
+from app.db.models.product import AddProduct, GetProduct, SimilarProductQuery, SimilarProduct, ProductFacets
 from app.services.validation import check_product_details
 from app.services.moderation import check_product_moderation
 
 router = APIRouter(prefix="/api", tags=["Product"])
 
 
+def product_filters(
+    category: Optional[str] = None,
+    brand: Optional[str] = None,
+    colour: Optional[str] = None,
+    min_price: Optional[int] = None,
+    max_price: Optional[int] = None,
+):
+    """
+    Optional filters shared by the product list and facet endpoints.
+    """
+    return build_product_filter(category, brand, colour, min_price, max_price)
+
+
 @router.post("/products", response_model=str, summary="Add a new product")
-async def create_product(product: AddProduct):
+async def create_product(product: AddProduct, allow_duplicate: bool = False):
     """
     Create a new product in the database.
     - **product**: Product details as per AddProduct schema.
+    - **allow_duplicate**: Skip the near-duplicate check.
     """
+    # Reject near-duplicates before paying for validation, moderation and upload
+    if not allow_duplicate:
+        duplicates = await run_in_threadpool(find_duplicate_products, product)
+        if duplicates:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Product looks like a duplicate of {duplicates[0]['id']} (similarity {duplicates[0]['score']}).",
+            )
+
     # Validate product details using the external API
-    validation_result = check_product_details(product.dict())
+    validation_result = await run_in_threadpool(check_product_details, product.dict())
     if not validation_result.get("validated"):
         raise HTTPException(
             status_code=400,
@@ -24,7 +49,7 @@ async def create_product(product: AddProduct):
         )
     
     # Check the moderation status of the product details
-    moderation_result = check_product_moderation(product.dict())
+    moderation_result = await run_in_threadpool(check_product_moderation, product.dict())
     if moderation_result.get("inappropriate_content"):
         raise HTTPException(
             status_code=400,
@@ -37,19 +62,50 @@ async def create_product(product: AddProduct):
         raise HTTPException(status_code=500, detail="Failed to add product.")
     return product_id
 
+@router.post(
+    "/products/similar",
+    response_model=List[SimilarProduct],
+    summary="Find products similar to a candidate",
+)
+async def similar_products(query: SimilarProductQuery):
+    """
+    Retrieve the catalogue entries most similar to a candidate product.
+    - **query**: Name, description, brand and optional image of the candidate, and how many matches to return.
+    """
+    return await run_in_threadpool(find_similar_products, query)
+
+
 @router.get(
     "/products", response_model=List[GetProduct], summary="Retrieve all products"
 )
-async def list_products():
+async def list_products(filters: dict = Depends(product_filters)):
     """
     Retrieve all products from the database.
+    - **category**, **brand**, **colour**, **min_price**, **max_price**: Optional filters.
     """
-    products = get_all_products()
+    products = get_all_products(filters)
     if not products:
         raise HTTPException(status_code=404, detail="No products found.")
     return products
 
 
+@router.get(
+    "/products/facets",
+    response_model=ProductFacets,
+    summary="Retrieve facet counts for navigation",
+)
+async def product_facets(filters: dict = Depends(product_filters)):
+    """
+    Retrieve product counts per category, brand, colour, price bucket and
+    popular dynamic attribute keys.
+    - **category**, **brand**, **colour**, **min_price**, **max_price**: Optional filters, as for the product list.
+    """
+    facets = get_product_facets(filters)
+    if facets is None:
+        raise HTTPException(status_code=500, detail="Failed to compute product facets.")
+    return facets
+
+
 @router.put(
     "/products/{product_id}",
     response_model=GetProduct,
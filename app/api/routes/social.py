@@ -1,9 +1,22 @@
+import json
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, conint, conlist
+from typing import Optional
+from app.db.crud.instagram_import import (
+    create_import_job,
+    get_import_job,
+    save_import_result,
+)
 from app.services.instagram import (
     get_instagram_post,
     analyze_image_with_mistral,
+    get_instagram_post_shortcode,
+    get_instagram_profile_post_urls,
+    parse_mistral_attributes,
 )
+from app.services.instagram_import import fetch_semaphore, import_instagram_posts
 from app.services.moderation import check_product_moderation
 
 router = APIRouter(prefix="/social", tags=["social"])
@@ -13,15 +26,29 @@ class InstagramPostRequest(BaseModel):
     url: str
 
 
+# Upper bound on posts per import job; every result is stored in one job
+# document, which must stay well under Mongo's 16 MB limit
+MAX_IMPORT_POSTS = 200
+
+
+class InstagramBulkImportRequest(BaseModel):
+    urls: conlist(str, max_items=MAX_IMPORT_POSTS) = []
+    profile: Optional[str] = None
+    limit: conint(ge=1, le=MAX_IMPORT_POSTS) = 50
+    job_id: Optional[str] = None  # Resume an interrupted import
+
+
 @router.post("/analyze-instagram-post/")
 async def analyze_instagram_post(data: InstagramPostRequest):
     """
     Endpoint to analyze an Instagram post by URL.
     """
     try:
-        # Process the Instagram post to get Cloudinary URLs
-        download_dir = "media"
-        analysis_result = get_instagram_post(data.url, download_dir=download_dir)
+        # Process the Instagram post to get Cloudinary URLs. The shared session
+        # is bounded like bulk imports, and fetching may wait on the Instagram
+        # rate limit, so keep it off the event loop
+        async with fetch_semaphore:
+            analysis_result = await run_in_threadpool(get_instagram_post, data.url)
 
         if not analysis_result:
             raise HTTPException(
@@ -38,7 +65,9 @@ async def analyze_instagram_post(data: InstagramPostRequest):
             )
 
         # Use the Mistral API to analyze the image and generate attributes
-        mistral_analysis = analyze_image_with_mistral(media_urls, caption)
+        mistral_analysis = await run_in_threadpool(
+            analyze_image_with_mistral, media_urls, caption
+        )
 
         if not mistral_analysis:
             raise HTTPException(
@@ -49,26 +78,20 @@ async def analyze_instagram_post(data: InstagramPostRequest):
             return {"message": "Inappropriate image"}
 
         # Parse the attributes content
-        raw_attributes = mistral_analysis.get("attributes", {})
-        choices = raw_attributes.get("choices", [])
-        parsed_content = {}
-
-        if choices and "content" in choices[0]["message"]:
-            # Parse the JSON content from the Mistral response
-            import json
-
-            try:
-                parsed_content = json.loads(choices[0]["message"]["content"])
-            except json.JSONDecodeError:
-                raise HTTPException(
-                    status_code=500, detail="Failed to parse attributes content."
-                )
+        try:
+            parsed_content = parse_mistral_attributes(mistral_analysis)
+        except json.JSONDecodeError:
+            raise HTTPException(
+                status_code=500, detail="Failed to parse attributes content."
+            )
 
         # Prepare the cleaned response
         cleaned_response = {"image": media_urls, "attributes": parsed_content}
 
         # Check the moderation status of the product details
-        moderation_result = check_product_moderation(parsed_content)
+        moderation_result = await run_in_threadpool(
+            check_product_moderation, parsed_content
+        )
 
         if moderation_result.get("inappropriate_content"):
             raise HTTPException(
@@ -84,3 +107,93 @@ async def analyze_instagram_post(data: InstagramPostRequest):
         raise HTTPException(
             status_code=500, detail=f"An unexpected error occurred: {str(e)}"
         )
+
+
+def _shortcode_or_none(url: str):
+    try:
+        return get_instagram_post_shortcode(url)
+    except ValueError:
+        return None
+
+
+@router.post("/import-instagram-posts/")
+async def import_instagram(data: InstagramBulkImportRequest):
+    """
+    Endpoint to analyze many Instagram posts, given as URLs or a profile name.
+
+    Streams newline-delimited JSON: a header with the job_id, one line per post
+    as it completes, then a summary. Posts already finished under job_id are
+    replayed from the saved progress instead of being processed again.
+    """
+    if data.job_id:
+        job = get_import_job(data.job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Import job not found.")
+    else:
+        urls = list(data.urls)
+        if data.profile:
+            try:
+                urls += await run_in_threadpool(
+                    get_instagram_profile_post_urls, data.profile, data.limit
+                )
+            except Exception as e:
+                raise HTTPException(
+                    status_code=400, detail=f"Could not load Instagram profile: {str(e)}"
+                )
+        # Drop repeated URLs while keeping the requested order
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            raise HTTPException(status_code=400, detail="No post URLs to import.")
+        if len(urls) > MAX_IMPORT_POSTS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Too many posts to import at once (max {MAX_IMPORT_POSTS}).",
+            )
+        job = create_import_job(urls)
+        if not job:
+            raise HTTPException(status_code=500, detail="Failed to create import job.")
+
+    job_id = job["_id"]
+    finished = {
+        shortcode: result
+        for shortcode, result in job.get("results", {}).items()
+        if result.get("status") != "error"  # Failed posts are retried on resume
+    }
+    pending = [url for url in job["urls"] if _shortcode_or_none(url) not in finished]
+
+    async def stream():
+        counts = {"ok": 0, "inappropriate": 0, "error": 0}
+        yield json.dumps({"job_id": job_id, "total": len(job["urls"]), "pending": len(pending)}) + "\n"
+
+        for result in finished.values():
+            counts[result["status"]] += 1
+            yield json.dumps({**result, "resumed": True}) + "\n"
+
+        async for result in import_instagram_posts(pending):
+            counts[result["status"]] += 1
+            if result.get("shortcode"):
+                await run_in_threadpool(
+                    save_import_result, job_id, result["shortcode"], result
+                )
+            yield json.dumps(result) + "\n"
+
+        yield json.dumps({"job_id": job_id, "done": True, **counts}) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@router.get("/import-instagram-posts/{job_id}")
+async def instagram_import_progress(job_id: str):
+    """
+    Endpoint to check the progress of a bulk Instagram import.
+    """
+    job = get_import_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found.")
+    results = job.get("results", {})
+    return {
+        "job_id": job_id,
+        "total": len(job["urls"]),
+        "completed": len(results),
+        "results": list(results.values()),
+    }
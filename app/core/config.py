@@ -9,6 +9,26 @@ class Settings(BaseSettings):
     MONGODB_DB_NAME: str = os.environ.get("MONGODB_DB_NAME")
     CLOUDINARY_SECRET: str = os.environ.get("CLOUDINARY_SECRET")
     MISTRAL_API_KEY: str = os.environ.get("MISTRAL_API_KEY")    
+    CACHE_PATH: str = os.environ.get("CACHE_PATH", "/dev/shm/s2s-cache.sqlite3")
+    CACHE_TTL: int = int(os.environ.get("CACHE_TTL", 300))
+    VERDICT_CACHE_TTL: int = int(os.environ.get("VERDICT_CACHE_TTL", 86400))
+    PROMPT_TOKEN_BUDGET: int = int(os.environ.get("PROMPT_TOKEN_BUDGET", 1500))
+    PROMPT_MAX_VALUE_CHARS: int = int(os.environ.get("PROMPT_MAX_VALUE_CHARS", 2000))
+    MODERATION_ESCALATION_RATE: float = float(
+        os.environ.get("MODERATION_ESCALATION_RATE", 0.05)
+    )
+    INSTAGRAM_MIN_INTERVAL: float = float(os.environ.get("INSTAGRAM_MIN_INTERVAL", 2.0))
+    INSTAGRAM_FETCH_CONCURRENCY: int = int(
+        os.environ.get("INSTAGRAM_FETCH_CONCURRENCY", 1)
+    )
+    INSTAGRAM_IMPORT_CONCURRENCY: int = int(
+        os.environ.get("INSTAGRAM_IMPORT_CONCURRENCY", 4)
+    )
+    FACET_CACHE_TTL: int = int(os.environ.get("FACET_CACHE_TTL", 3600))
+    FACET_ATTRIBUTE_LIMIT: int = int(os.environ.get("FACET_ATTRIBUTE_LIMIT", 20))
+    DUPLICATE_SIMILARITY_THRESHOLD: float = float(
+        os.environ.get("DUPLICATE_SIMILARITY_THRESHOLD", 0.9)
+    )
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,179 @@
+import time
+from ..mongo import get_collection
+from app.core.config import settings
+from app.services.cache import cache, payload_digest
+
+# Get the products collection
+collection = get_collection("products")
+
+# Lower bounds of the price buckets; the last bucket is open-ended
+PRICE_BOUNDARIES = [0, 500, 1000, 2500, 5000, 10000, 25000]
+
+# Fields counted by value
+VALUE_FACETS = ["category", "brand", "colour"]
+
+# Projection of the fields a product contributes to facet counts
+FACET_FIELDS = {field: 1 for field in VALUE_FACETS + ["price", "dynamic_attributes"]}
+
+# Unscoped counts are kept up to date incrementally on every write
+ALL_FACETS_KEY = "facets:all"
+SCOPED_FACETS_PREFIX = "facets:q:"
+
+# Write generation, bumped before and after every product write. Facets are
+# stored with the generation read before their aggregation so writes that
+# overlap an aggregation are neither lost nor counted twice
+GENERATION_KEY = "facets:generation"
+
+
+def price_bucket(price):
+    """
+    Label of the price bucket a price falls in, e.g. "500-1000" or "25000+".
+    """
+    if price is None or price < PRICE_BOUNDARIES[0]:
+        return "other"
+    for lower, upper in zip(PRICE_BOUNDARIES, PRICE_BOUNDARIES[1:]):
+        if price < upper:
+            return f"{lower}-{upper}"
+    return f"{PRICE_BOUNDARIES[-1]}+"
+
+
+def _facet_pipeline(filters: dict):
+    by_value = {
+        field: [{"$group": {"_id": f"${field}", "count": {"$sum": 1}}}]
+        for field in VALUE_FACETS
+    }
+    return [
+        {"$match": filters},
+        {
+            "$facet": {
+                **by_value,
+                "price": [
+                    {
+                        "$bucket": {
+                            "groupBy": "$price",
+                            "boundaries": PRICE_BOUNDARIES + [float("inf")],
+                            "default": "other",
+                            "output": {"count": {"$sum": 1}},
+                        }
+                    }
+                ],
+                "dynamic_attributes": [
+                    {"$project": {"kv": {"$objectToArray": "$dynamic_attributes"}}},
+                    {"$unwind": "$kv"},
+                    {"$group": {"_id": "$kv.k", "count": {"$sum": 1}}},
+                ],
+                "total": [{"$count": "count"}],
+            }
+        },
+    ]
+
+
+def _compute_facets(filters: dict):
+    result = next(collection.aggregate(_facet_pipeline(filters)), {})
+    facets = {
+        field: {str(bucket["_id"]): bucket["count"] for bucket in result.get(field, [])}
+        for field in VALUE_FACETS + ["dynamic_attributes"]
+    }
+    facets["price"] = {
+        (bucket["_id"] if bucket["_id"] == "other" else price_bucket(bucket["_id"])): bucket["count"]
+        for bucket in result.get("price", [])
+    }
+    total = result.get("total", [])
+    facets["total"] = total[0]["count"] if total else 0
+    facets["computed_at"] = time.time()
+    return facets
+
+
+def _public_facets(facets: dict):
+    # Only the most popular dynamic attribute keys are worth a sidebar entry
+    attributes = sorted(
+        facets["dynamic_attributes"].items(), key=lambda item: item[1], reverse=True
+    )
+    return {
+        **{field: facets[field] for field in VALUE_FACETS + ["price", "total"]},
+        "dynamic_attributes": dict(attributes[: settings.FACET_ATTRIBUTE_LIMIT]),
+    }
+
+
+def get_product_facets(filters: dict = None):
+    """
+    Retrieve facet counts (category, brand, colour, price bucket and popular
+    dynamic attribute keys) for the products matching filters.
+    Returns a dictionary of counts, or None if the aggregation failed.
+    """
+    try:
+        key = (
+            f"{SCOPED_FACETS_PREFIX}{payload_digest(filters)}" if filters else ALL_FACETS_KEY
+        )
+        facets = cache.get(key)
+        # Recompute periodically so any drift in incremental counts heals
+        if facets is None or time.time() - facets["computed_at"] > settings.FACET_CACHE_TTL:
+            generation = cache.get(GENERATION_KEY) or 0
+            facets = _compute_facets(filters or {})
+            facets["generation"] = generation
+
+            def store(current):
+                # A write moved the generation during the aggregation, so the
+                # result may or may not include it; serve it but do not cache it
+                if (cache.get(GENERATION_KEY) or 0) != generation:
+                    return current
+                return facets
+
+            cache.update(key, store, ttl=settings.FACET_CACHE_TTL)
+        return _public_facets(facets)
+    except Exception as e:
+        print(f"An error occurred while computing product facets: {e}")
+        return None
+
+
+def _apply_delta(facets, product: dict, sign: int):
+    for field in VALUE_FACETS:
+        value = str(product.get(field))
+        facets[field][value] = facets[field].get(value, 0) + sign
+    bucket = price_bucket(product.get("price"))
+    facets["price"][bucket] = facets["price"].get(bucket, 0) + sign
+    for attribute in (product.get("dynamic_attributes") or {}):
+        facets["dynamic_attributes"][attribute] = (
+            facets["dynamic_attributes"].get(attribute, 0) + sign
+        )
+    facets["total"] += sign
+    # Drop values that no longer have any products
+    for field in VALUE_FACETS + ["price", "dynamic_attributes"]:
+        facets[field] = {value: count for value, count in facets[field].items() if count > 0}
+
+
+def begin_facet_change():
+    """
+    Call before a product write. Returns the write generation to pass to
+    record_facet_change once the write is done.
+    """
+    return cache.incr(GENERATION_KEY)
+
+
+def record_facet_change(generation, old: dict = None, new: dict = None):
+    """
+    Keep cached facet counts in step with a product write. generation is the
+    value returned by begin_facet_change, old is the product before the write
+    (None for inserts) and new the product after it (None for deletes).
+    Unscoped counts are adjusted in place; scoped counts are dropped and
+    recomputed on next read.
+    """
+
+    def adjust(facets):
+        # Counts aggregated after begin_facet_change may already include this
+        # write; drop them rather than risk counting it twice
+        if facets is None or generation is None or facets.get("generation", 0) >= generation:
+            return None
+        if old:
+            _apply_delta(facets, old, -1)
+        if new:
+            _apply_delta(facets, new, 1)
+        return facets
+
+    try:
+        cache.incr(GENERATION_KEY)
+        cache.update(ALL_FACETS_KEY, adjust, ttl=settings.FACET_CACHE_TTL)
+        cache.delete_prefix(SCOPED_FACETS_PREFIX)
+    except Exception as e:
+        print(f"An error occurred while updating product facets: {e}")
+        cache.delete(ALL_FACETS_KEY)
@@ -0,0 +1,54 @@
+from datetime import datetime, timezone
+from uuid import uuid4
+from ..mongo import get_collection
+
+# Get the Instagram import jobs collection
+collection = get_collection("instagram_imports")
+
+
+def create_import_job(urls):
+    """
+    Record a new bulk import job for the given post URLs.
+    Returns the job document.
+    """
+    try:
+        job = {
+            "_id": uuid4().hex,
+            "urls": urls,
+            "results": {},
+            "created_at": datetime.now(timezone.utc),
+        }
+        collection.insert_one(job)
+        return job
+    except Exception as e:
+        print(f"An error occurred while creating an import job: {e}")
+        return None
+
+
+def get_import_job(job_id: str):
+    """
+    Retrieve a bulk import job by its ID, or None if it does not exist.
+    """
+    try:
+        return collection.find_one({"_id": job_id})
+    except Exception as e:
+        print(f"An error occurred while retrieving an import job: {e}")
+        return None
+
+
+def save_import_result(job_id: str, shortcode: str, result: dict):
+    """
+    Store the outcome of one post so an interrupted job can resume after it.
+    """
+    try:
+        collection.update_one(
+            {"_id": job_id},
+            {
+                "$set": {
+                    f"results.{shortcode}": result,
+                    "updated_at": datetime.now(timezone.utc),
+                }
+            },
+        )
+    except Exception as e:
+        print(f"An error occurred while saving an import result: {e}")
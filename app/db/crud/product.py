@@ -1,25 +1,91 @@
 from bson import ObjectId
-from ..models.product import AddProduct, GetProduct
+from ..models.product import AddProduct, GetProduct, SimilarProductQuery
 from ..mongo import get_collection
 from app.services.cloudinary import upload_to_cloudinary
+from app.services.cache import cache
+from app.services.similarity import index, find_duplicates, image_hash
+from .facets import begin_facet_change, record_facet_change, FACET_FIELDS
 
 # Get the products collection
 collection = get_collection("products")
 
 
-def get_all_products():
+# Bumped on every product write. Reads record it before querying Mongo and
+# only cache their result if no write happened in between
+PRODUCTS_VERSION_KEY = "products:version"
+
+
+def invalidate_product_cache(productid: str = None):
+    """
+    Drop cached product reads after a write so no worker serves stale data.
+    """
+    cache.incr(PRODUCTS_VERSION_KEY)
+    keys = ["products:all"]
+    if productid:
+        keys.append(f"products:id:{productid}")
+    cache.delete(*keys)
+
+
+def _cache_read(key: str, value, version):
+    """
+    Cache a read result unless a product write landed since version was read.
+    """
+
+    def store(current):
+        if (cache.get(PRODUCTS_VERSION_KEY) or 0) != version:
+            return current
+        return value
+
+    cache.update(key, store)
+
+
+def build_product_filter(
+    category: str = None,
+    brand: str = None,
+    colour: str = None,
+    min_price: int = None,
+    max_price: int = None,
+):
     """
-    Retrieve all products from the database.
+    Build a Mongo filter from the optional product list filters.
+    Returns an empty dict when no filter is set.
+    """
+    filters = {}
+    for field, value in (("category", category), ("brand", brand), ("colour", colour)):
+        if value is not None:
+            filters[field] = value
+    price = {}
+    if min_price is not None:
+        price["$gte"] = min_price
+    if max_price is not None:
+        price["$lte"] = max_price
+    if price:
+        filters["price"] = price
+    return filters
+
+
+def get_all_products(filters: dict = None):
+    """
+    Retrieve all products from the database, optionally matching filters.
     Returns a list of products as GetProduct instances.
     """
     try:
-        productscur = collection.find()
+        # Only the unfiltered catalogue is cached
+        if not filters:
+            cached = cache.get("products:all")
+            if cached is not None:
+                return [GetProduct(**obj) for obj in cached]
+
+        version = cache.get(PRODUCTS_VERSION_KEY) or 0
+        productscur = collection.find(filters or {})
         products = []
         for obj in productscur:
             obj["id"] = str(
                 obj.pop("_id")
             )  # Convert ObjectId to string and rename to 'id'
             products.append(GetProduct(**obj))  # Initialize Pydantic model
+        if not filters:
+            _cache_read("products:all", [product.dict() for product in products], version)
         return products
     except Exception as e:
         print(f"An error occurred while retrieving products: {e}")
@@ -32,12 +98,18 @@ def add_product(product: AddProduct):
     Returns the inserted product's ID as a string.
     """
     try:
+        # Hash the original image content before it is replaced by a link
+        img_hash = image_hash(product.image)
         # Check if image is base64 if it is then upload to cloudinary and replace with image link
         if product.image.startswith("data:image"):
             image_link = upload_to_cloudinary(product.image)
             product.image = image_link
-        result = collection.insert_one(product.dict())
+        generation = begin_facet_change()
+        result = collection.insert_one({**product.dict(), "image_hash": img_hash})
         product_id = str(result.inserted_id)
+        invalidate_product_cache()
+        record_facet_change(generation, new=product.dict())
+        index.add(product_id, product.dict(), img_hash)
         return product_id
     except Exception as e:
         print(f"An error occurred while adding a product: {e}")
@@ -50,12 +122,19 @@ def get_product_by_id(productid: str):
     Returns the product as a GetProduct instance.
     """
     try:
+        cached = cache.get(f"products:id:{productid}")
+        if cached is not None:
+            return GetProduct(**cached)
+
+        version = cache.get(PRODUCTS_VERSION_KEY) or 0
         product = collection.find_one({"_id": ObjectId(productid)})
         if product:
             product["id"] = str(
                 product.pop("_id")
             )  # Convert ObjectId to string and rename to 'id'
-            return GetProduct(**product)  # Convert to Pydantic model
+            product = GetProduct(**product)  # Convert to Pydantic model
+            _cache_read(f"products:id:{productid}", product.dict(), version)
+            return product
     except Exception as e:
         print(f"An error occurred while retrieving a product: {e}")
     return None
@@ -67,9 +146,24 @@ def update_product(productid: str, product: AddProduct):
     Returns True if the update was successful, False otherwise.
     """
     try:
+        old = collection.find_one(
+            {"_id": ObjectId(productid)}, {**FACET_FIELDS, "image": 1, "image_hash": 1}
+        )
+        # Keep the stored content hash while the image is unchanged; it was
+        # taken from the original upload, not from the Cloudinary link
+        if old and old.get("image") == product.image and old.get("image_hash"):
+            img_hash = old["image_hash"]
+        else:
+            img_hash = image_hash(product.image)
+        generation = begin_facet_change()
         result = collection.update_one(
-            {"_id": ObjectId(productid)}, {"$set": product.dict()}
+            {"_id": ObjectId(productid)},
+            {"$set": {**product.dict(), "image_hash": img_hash}},
         )
+        invalidate_product_cache(productid)
+        if result.matched_count:
+            record_facet_change(generation, old=old, new=product.dict())
+            index.add(productid, product.dict(), img_hash)
         return result.upserted_id
     except Exception as e:
         print(f"An error occurred while updating a product: {e}")
@@ -81,9 +175,43 @@ def delete_product(productid: str):
     Returns True if the deletion was successful, False otherwise.
     """
     try:
-        result = collection.delete_one({"_id": ObjectId(productid)})
+        generation = begin_facet_change()
+        old = collection.find_one_and_delete(
+            {"_id": ObjectId(productid)}, projection=FACET_FIELDS
+        )
+        invalidate_product_cache(productid)
+        if old:
+            record_facet_change(generation, old=old)
+            index.remove(productid)
         all_products = get_all_products()
         return all_products
     except Exception as e:
         print(f"An error occurred while deleting a product: {e}")
-        return False
\ No newline at end of file
+        return False
+
+
+def find_duplicate_products(product: AddProduct, exclude: str = None):
+    """
+    Find catalogue entries that are near-duplicates of a product.
+    Returns a list of {"id", "score", "image_match"} matches, best first.
+    """
+    try:
+        return find_duplicates(
+            collection, product.dict(), image_hash(product.image), exclude=exclude
+        )
+    except Exception as e:
+        print(f"An error occurred while checking for duplicate products: {e}")
+        return []
+
+
+def find_similar_products(query: SimilarProductQuery):
+    """
+    Retrieve the catalogue entries most similar to a candidate product.
+    Returns a list of {"id", "score", "image_match"} matches, best first.
+    """
+    try:
+        index.ensure_current(collection)
+        return index.query(query.dict(), k=query.k, img_hash=image_hash(query.image))
+    except Exception as e:
+        print(f"An error occurred while searching similar products: {e}")
+        return []
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Dict
+from pydantic import BaseModel, conint
+from typing import Dict, Optional
 
 
 class AddProduct(BaseModel):
@@ -37,3 +37,38 @@ class GetProduct(BaseModel):
     dynamic_attributes: Dict[str, str]
     amount_in_stock: int
     price: int
+
+
+class SimilarProductQuery(BaseModel):
+    """
+    Model for looking up catalogue entries similar to a candidate product.
+    """
+
+    product_name: str
+    product_description: str = ""
+    brand: str = ""
+    image: Optional[str] = None
+    k: conint(ge=1, le=50) = 5
+
+
+class SimilarProduct(BaseModel):
+    """
+    Model for a similarity lookup match.
+    """
+
+    id: str
+    score: float
+    image_match: bool
+
+
+class ProductFacets(BaseModel):
+    """
+    Model for facet counts used by storefront navigation.
+    """
+
+    total: int
+    category: Dict[str, int]
+    brand: Dict[str, int]
+    colour: Dict[str, int]
+    price: Dict[str, int]
+    dynamic_attributes: Dict[str, int]
@@ -1,7 +1,9 @@
 from pymongo import MongoClient
 from app.core.config import settings
 
-client = MongoClient(settings.MONGODB_URL, uuidRepresentation="standard")
+# connect=False defers connecting until the first operation, so gunicorn can
+# preload the app and fork workers that each open their own connection pool
+client = MongoClient(settings.MONGODB_URL, uuidRepresentation="standard", connect=False)
 
 db = client[settings.MONGODB_DB_NAME]
 
@@ -2,6 +2,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.routes.product import router as product_router
 from app.api.routes.social import router as social_router
+from app.api.routes.metrics import router as metrics_router
 
 
 app = FastAPI()
@@ -22,6 +23,7 @@ app.add_middleware(
 
 app.include_router(product_router)
 app.include_router(social_router)
+app.include_router(metrics_router)
 
 
 @app.get("/")
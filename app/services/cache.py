@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from app.core.config import settings
+
+
+class SharedCache:
+    """
+    Key/value cache shared by every worker process on the host.
+
+    Entries live in a SQLite database placed on a tmpfs mount (``/dev/shm`` by
+    default), so all workers started by gunicorn read and write the same
+    memory-backed segment and a cache fill in one worker is a hit in the others.
+    Values are stored as JSON.
+    """
+
+    def __init__(self, path: str, default_ttl: int = 300):
+        self.default_ttl = default_ttl
+        self._local = threading.local()
+        self._pid = os.getpid()
+        # Hosts without a writable /dev/shm (e.g. macOS) use the temp directory;
+        # if neither works the cache is disabled and every lookup is a miss
+        self.path = None
+        fallback = os.path.join(tempfile.gettempdir(), os.path.basename(path))
+        for candidate in dict.fromkeys([path, fallback]):
+            try:
+                os.makedirs(os.path.dirname(candidate) or ".", exist_ok=True)
+                self.path = candidate
+                self._connect().execute(
+                    "CREATE TABLE IF NOT EXISTS cache ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+                )
+                break
+            except (OSError, sqlite3.Error) as e:
+                print(f"Cache unavailable at {candidate}: {e}")
+                self.path = None
+                self._local = threading.local()
+
+    def _connect(self):
+        if self.path is None:
+            raise sqlite3.OperationalError("shared cache is disabled")
+        # One connection per thread and process; sqlite3 connections must not be
+        # shared across threads or carried over a fork from the gunicorn master
+        if self._pid != os.getpid():
+            self._local = threading.local()
+            self._pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def _expiry(self, ttl):
+        ttl = self.default_ttl if ttl is None else ttl
+        return time.time() + ttl if ttl > 0 else None
+
+    def get(self, key: str):
+        """
+        Return the cached value for key, or None if missing or expired.
+        """
+        try:
+            row = self._connect().execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at < time.time():
+                self.delete(key)
+                return None
+            return json.loads(value)
+        except sqlite3.Error as e:
+            print(f"Cache read error for {key}: {e}")
+            return None
+
+    def set(self, key: str, value, ttl: int = None):
+        """
+        Store a JSON-serialisable value. A ttl of 0 keeps the entry until deleted.
+        """
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), self._expiry(ttl)),
+            )
+        except sqlite3.Error as e:
+            print(f"Cache write error for {key}: {e}")
+
+    def delete(self, *keys: str):
+        try:
+            self._connect().executemany(
+                "DELETE FROM cache WHERE key = ?", [(key,) for key in keys]
+            )
+        except sqlite3.Error as e:
+            print(f"Cache delete error for {keys}: {e}")
+
+    def delete_prefix(self, prefix: str):
+        try:
+            self._connect().execute(
+                "DELETE FROM cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+            )
+        except sqlite3.Error as e:
+            print(f"Cache delete error for prefix {prefix}: {e}")
+
+    def update(self, key: str, fn, ttl: int = None):
+        """
+        Atomically replace the value for key with fn(current_value) across workers.
+        current_value is None when the key is missing or expired.
+        Returns the new value.
+        """
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+                ).fetchone()
+                current = None
+                if row is not None and (row[1] is None or row[1] >= time.time()):
+                    current = json.loads(row[0])
+                value = fn(current)
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), self._expiry(ttl)),
+                )
+                conn.execute("COMMIT")
+                return value
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            print(f"Cache update error for {key}: {e}")
+            return None
+
+    def incr(self, key: str, amount: int = 1):
+        """
+        Increment a counter shared by all workers. Counters never expire.
+        """
+        return self.update(key, lambda current: (current or 0) + amount, ttl=0)
+
+
+def payload_digest(payload) -> str:
+    """
+    Hash of a JSON-like payload, stable across workers and restarts.
+    """
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def verdict_key(kind: str, payload) -> str:
+    """
+    Cache key for an LLM verdict on payload.
+    """
+    return f"verdict:{kind}:{payload_digest(payload)}"
+
+
+cache = SharedCache(settings.CACHE_PATH, default_ttl=settings.CACHE_TTL)
@@ -1,14 +1,49 @@
 import instaloader
 from app.services.cloudinary import upload_to_cloudinary
 from app.core.config import settings
+from app.services.cache import cache
+from app.services.payload import truncate_text
+from app.services.usage import record_usage
+import json
 import os
 import shutil
+import tempfile
+import threading
+import time
 import requests
 from urllib.parse import urlparse
 
 
-# Initialize Instaloader
-L = instaloader.Instaloader()
+# Initialize Instaloader. One session is shared by every request; posts are
+# downloaded straight into the target directory passed to download_post.
+L = instaloader.Instaloader(dirname_pattern="{target}")
+
+# Instagram rate limiting: fetches through the shared session are spaced at
+# least INSTAGRAM_MIN_INTERVAL seconds apart across every worker on the host.
+# Each fetch reserves the next free slot in the shared cache and sleeps until it.
+RATE_LIMIT_KEY = "instagram:next_fetch"
+
+# Used only when the shared cache is unavailable
+_fetch_lock = threading.Lock()
+_last_fetch = 0.0
+
+
+def _reserve_fetch_slot(last):
+    return max(time.time(), (last or 0) + settings.INSTAGRAM_MIN_INTERVAL)
+
+
+def wait_for_instagram_rate_limit():
+    """
+    Block until the shared Instaloader session may make its next fetch.
+    """
+    global _last_fetch
+    slot = cache.update(RATE_LIMIT_KEY, _reserve_fetch_slot, ttl=0)
+    if slot is None:
+        with _fetch_lock:
+            slot = _last_fetch = _reserve_fetch_slot(_last_fetch)
+    wait = slot - time.time()
+    if wait > 0:
+        time.sleep(wait)
 
 
 def analyze_image_with_mistral(media_urls, caption):
@@ -43,11 +78,13 @@ def analyze_image_with_mistral(media_urls, caption):
             "max_tokens": 300,
         }
 
+        started = time.monotonic()
         response = requests.post(
             "https://api.mistral.ai/v1/chat/completions",
             headers=headers,
             json=payload,
         )
+        record_usage("instagram_description", response, started)
 
         if response.status_code != 200:
             print(f"Mistral API error: {response.status_code}, {response.text}")
@@ -68,7 +105,7 @@ def analyze_image_with_mistral(media_urls, caption):
                 {
                     "role": "user",
                     "content": f"""Image description: {description},
-                    Post caption: {caption}
+                    Post caption: {truncate_text(caption, settings.PROMPT_MAX_VALUE_CHARS)}
                     Ignore the hashtags and emojis in the caption do not include those in any response.
                     Based on the above details generate the following attributes (whichever are possible) for this product.
 
@@ -86,11 +123,13 @@ def analyze_image_with_mistral(media_urls, caption):
             "response_format": {"type": "json_object"},
         }
 
+        started = time.monotonic()
         attributes_response = requests.post(
             "https://api.mistral.ai/v1/chat/completions",
             headers=headers,
             json=payload_attributes,
         )
+        record_usage("instagram_attributes", attributes_response, started)
 
         if attributes_response.status_code != 200:
             print(
@@ -109,6 +148,18 @@ def analyze_image_with_mistral(media_urls, caption):
         return None
 
 
+def parse_mistral_attributes(mistral_analysis):
+    """
+    Extract the product attributes JSON from an analyze_image_with_mistral result.
+    Raises ValueError if the attributes content is not valid JSON.
+    """
+    raw_attributes = mistral_analysis.get("attributes", {})
+    choices = raw_attributes.get("choices", [])
+    if choices and "content" in choices[0]["message"]:
+        return json.loads(choices[0]["message"]["content"])
+    return {}
+
+
 def clean_up_folder(folder_path):
     """
     Delete the specified folder and all its contents.
@@ -132,42 +183,75 @@ def get_instagram_post_shortcode(url):
     else:
         raise ValueError("Invalid Instagram post URL format.")
 
-def get_instagram_post(url: str, download_dir: str = "media"):
+def fetch_instagram_post(shortcode: str, download_dir: str):
     """
-    Get and analyze a post from Instagram by its URL.
+    Download an Instagram post's images into download_dir using the shared session.
+    Returns the caption and the downloaded image paths.
     """
-    try:
-        # Post url can also be like: https://www.instagram.com/username/p/C6dV6ujNa1a/?hl=en&img_index=1
+    wait_for_instagram_rate_limit()
+    post = instaloader.Post.from_shortcode(L.context, shortcode)
 
-        # Extract the shortcode from the URL
-        shortcode = get_instagram_post_shortcode(url)
+    # Ensure directory exists
+    os.makedirs(download_dir, exist_ok=True)
 
-        if shortcode:
+    # Download post to the specified directory
+    L.download_post(post, target=download_dir)
+
+    files = [
+        os.path.join(download_dir, file_name)
+        for file_name in sorted(os.listdir(download_dir))
+        if file_name.endswith((".jpg", ".jpeg", ".png"))
+    ]
+    return {"caption": post.caption if post.caption else "", "files": files}
+
+
+def upload_post_media(files):
+    """
+    Upload downloaded post images to Cloudinary and return their links.
+    """
+    media_urls = []
+    for file_path in files:
+        image_url = upload_to_cloudinary(file_path, resource_type="image")
+        if image_url:
+            media_urls.append(image_url)
+    return media_urls
 
-            post = instaloader.Post.from_shortcode(L.context, shortcode)
 
-            # Ensure directory exists
-            os.makedirs(download_dir, exist_ok=True)
+def get_instagram_profile_post_urls(username: str, limit: int = 50):
+    """
+    List the URLs of a profile's most recent posts, newest first.
+    """
+    wait_for_instagram_rate_limit()
+    profile = instaloader.Profile.from_username(L.context, username)
+    urls = []
+    for post in profile.get_posts():
+        if len(urls) >= limit:
+            break
+        urls.append(f"https://www.instagram.com/p/{post.shortcode}/")
+    return urls
 
-            # Default caption
-            caption = post.caption if post.caption else ""
 
-            # Initialize post data
-            post_data = {"caption": caption, "media_urls": []}
+def get_instagram_post(url: str, download_dir: str = None):
+    """
+    Get and analyze a post from Instagram by its URL.
+    """
+    # Each call gets its own directory so concurrent requests never delete
+    # each other's downloads
+    download_dir = download_dir or tempfile.mkdtemp(prefix="instagram-")
+    try:
+        # Post url can also be like: https://www.instagram.com/username/p/C6dV6ujNa1a/?hl=en&img_index=1
 
-            # Download post to the specified directory
-            L.dirname_pattern = download_dir
-            L.download_post(post, target=download_dir)
+        # Extract the shortcode from the URL
+        shortcode = get_instagram_post_shortcode(url)
 
-            # Analyze files in the directory
-            for file_name in os.listdir(download_dir):
-                file_path = os.path.join(download_dir, file_name)
-                if file_name.endswith((".jpg", ".jpeg", ".png")):
-                    # Upload image to Cloudinary
-                    image_url = upload_to_cloudinary(file_path, resource_type="image")
-                    post_data["media_urls"].append(image_url)
+        if shortcode:
+            post = fetch_instagram_post(shortcode, download_dir)
 
-            return post_data
+            # Upload images to Cloudinary
+            return {
+                "caption": post["caption"],
+                "media_urls": upload_post_media(post["files"]),
+            }
 
         else:
             print("Invalid Instagram post URL.")
@@ -0,0 +1,102 @@
+import asyncio
+import tempfile
+from fastapi.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.services.instagram import (
+    analyze_image_with_mistral,
+    clean_up_folder,
+    fetch_instagram_post,
+    get_instagram_post_shortcode,
+    parse_mistral_attributes,
+    upload_post_media,
+)
+from app.services.moderation import check_product_moderation
+
+
+# Fetches go through the one shared Instaloader session, so their bound is
+# shared by every import job and single-post request in the worker
+fetch_semaphore = asyncio.Semaphore(settings.INSTAGRAM_FETCH_CONCURRENCY)
+
+
+def _stage_semaphores():
+    # Each pipeline stage gets its own bound so a slow stage (Mistral) cannot
+    # starve the others, and Instagram fetches stay within the rate limit
+    return {
+        "fetch": fetch_semaphore,
+        "upload": asyncio.Semaphore(settings.INSTAGRAM_IMPORT_CONCURRENCY),
+        "analyze": asyncio.Semaphore(settings.INSTAGRAM_IMPORT_CONCURRENCY),
+        "moderate": asyncio.Semaphore(settings.INSTAGRAM_IMPORT_CONCURRENCY),
+    }
+
+
+async def _import_post(url: str, semaphores):
+    """
+    Run one post through the fetch, upload, analyze and moderate stages.
+    Never raises; failures are reported in the returned result.
+    """
+    result = {"url": url}
+    try:
+        shortcode = get_instagram_post_shortcode(url)
+        result["shortcode"] = shortcode
+        download_dir = tempfile.mkdtemp(prefix=f"instagram-{shortcode}-")
+        try:
+            async with semaphores["fetch"]:
+                post = await run_in_threadpool(
+                    fetch_instagram_post, shortcode, download_dir
+                )
+            async with semaphores["upload"]:
+                media_urls = await run_in_threadpool(upload_post_media, post["files"])
+        finally:
+            clean_up_folder(download_dir)
+
+        if not media_urls:
+            return {**result, "status": "error", "detail": "No media URLs found for analysis."}
+
+        async with semaphores["analyze"]:
+            mistral_analysis = await run_in_threadpool(
+                analyze_image_with_mistral, media_urls, post["caption"]
+            )
+        if not mistral_analysis:
+            return {**result, "status": "error", "detail": "Failed to analyze image using Mistral API."}
+        if mistral_analysis == "Inappropriate image":
+            return {**result, "status": "inappropriate", "detail": "Inappropriate image"}
+
+        try:
+            attributes = parse_mistral_attributes(mistral_analysis)
+        except ValueError:
+            return {**result, "status": "error", "detail": "Failed to parse attributes content."}
+
+        async with semaphores["moderate"]:
+            moderation_result = await run_in_threadpool(
+                check_product_moderation, attributes
+            )
+        if moderation_result.get("inappropriate_content"):
+            return {
+                **result,
+                "status": "inappropriate",
+                "detail": moderation_result.get("error", "Inappropriate Content"),
+            }
+
+        return {**result, "status": "ok", "image": media_urls, "attributes": attributes}
+    except Exception as e:
+        print(f"An error occurred while importing Instagram post {url}: {e}")
+        return {**result, "status": "error", "detail": str(e)}
+
+
+async def import_instagram_posts(urls):
+    """
+    Import many Instagram posts concurrently through a bounded pipeline.
+    Yields one result per post as soon as it completes, in completion order.
+    """
+    semaphores = _stage_semaphores()
+    tasks = [
+        asyncio.ensure_future(_import_post(url, semaphores))
+        for url in urls
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Client went away: stop queued posts instead of spending on them
+        for task in tasks:
+            task.cancel()
@@ -1,5 +1,11 @@
+import random
+import re
+import time
 import requests
 from app.core.config import settings
+from app.services.cache import cache, verdict_key
+from app.services.payload import shape_product_payload
+from app.services.usage import record_usage
 
 mistral_api_key = settings.MISTRAL_API_KEY
 headers = {
@@ -7,38 +13,180 @@ headers = {
     "Authorization": f"Bearer {mistral_api_key}",
 }
 
+# Local first tier: weighted term list scored before any remote call.
+# Terms weighted 1.0 are never acceptable in a listing and are denied outright;
+# lower weights mark terms that are fine in most products (kitchen knives,
+# lingerie, hunting gear) but need the remote model to judge in context.
+TERM_WEIGHTS = {
+    # Denied locally
+    "cocaine": 1.0,
+    "heroin": 1.0,
+    "methamphetamine": 1.0,
+    "fentanyl": 1.0,
+    "mdma": 1.0,
+    "porn": 1.0,
+    "pornographic": 1.0,
+    "escort service": 1.0,
+    "fake id": 1.0,
+    # Escalated to the remote model. Some of these usually mean a listing is
+    # not allowed, but they also appear in legitimate ones ("not counterfeit",
+    # "Stolen Kiss" lipstick, Grenade protein bars, history books)
+    "counterfeit": 0.8,
+    "stolen": 0.6,
+    "explosive": 0.6,
+    "grenade": 0.6,
+    "ammunition": 0.6,
+    "nazi": 0.6,
+    "gun": 0.4,
+    "pistol": 0.4,
+    "rifle": 0.4,
+    "weapon": 0.4,
+    "knife": 0.2,
+    "blade": 0.2,
+    "bullet": 0.4,
+    "kill": 0.3,
+    "blood": 0.3,
+    "drug": 0.4,
+    "cannabis": 0.4,
+    "weed": 0.3,
+    "vape": 0.3,
+    "tobacco": 0.3,
+    "alcohol": 0.2,
+    "adult": 0.3,
+    "nude": 0.4,
+    "naked": 0.4,
+    "sexy": 0.3,
+    "erotic": 0.5,
+    "lingerie": 0.2,
+    "replica": 0.4,
+    "hate": 0.3,
+    "suicide": 0.5,
+}
 
-def check_product_moderation(product_json):
+# Weight at which a single term is denied locally
+DENY_SCORE = 1.0
+
+# One alternation over every term, longest first so multi-word terms win;
+# plurals are matched and folded back onto the base term
+TERM_PATTERN = re.compile(
+    r"\b("
+    + "|".join(
+        re.escape(term).replace(r"\ ", r"\s+")
+        for term in sorted(TERM_WEIGHTS, key=len, reverse=True)
+    )
+    + r")(?:e?s)?\b",
+    re.IGNORECASE,
+)
+
+# Characters of surrounding text sent to the remote model on each side of a
+# matched term, so terms past the prompt truncation can still be cleared
+CONTEXT_CHARS = 80
+
+# Fields that never carry moderatable text
+SKIPPED_FIELDS = {"image", "image_hash", "price", "amount_in_stock"}
+
+# Shared counters, summed across all workers
+STAT_KEYS = ["local_allow", "local_deny", "escalated", "sampled", "remote_failures"]
+
+
+def _count(stat: str):
+    cache.incr(f"moderation:{stat}")
+
+
+def get_moderation_stats():
+    """
+    Return tier counters and how many remote moderation calls were saved.
+    """
+    stats = {stat: cache.get(f"moderation:{stat}") or 0 for stat in STAT_KEYS}
+    stats["remote_calls"] = stats["escalated"] + stats["sampled"]
+    stats["remote_calls_saved"] = (
+        stats["local_allow"] + stats["local_deny"] - stats["sampled"]
+    )
+    return stats
+
+
+def _moderation_text(value):
+    """
+    Flatten the text values of a product for local scoring.
+    """
+    if isinstance(value, dict):
+        return " ".join(
+            f"{key} {_moderation_text(item)}"
+            for key, item in value.items()
+            if key not in SKIPPED_FIELDS
+        )
+    if isinstance(value, (list, tuple)):
+        return " ".join(_moderation_text(item) for item in value)
+    if isinstance(value, str) and not value.startswith("data:"):
+        return value
+    return ""
+
+
+def _matched_terms(text: str):
+    return {
+        " ".join(match.group(1).lower().split()) for match in TERM_PATTERN.finditer(text)
+    }
+
+
+def _term_contexts(text: str):
+    """
+    Short windows of text around the first occurrence of each matched term.
+    """
+    contexts = {}
+    for match in TERM_PATTERN.finditer(text):
+        term = " ".join(match.group(1).lower().split())
+        if term not in contexts:
+            start = max(match.start() - CONTEXT_CHARS, 0)
+            window = " ".join(text[start : match.end() + CONTEXT_CHARS].split())
+            contexts[term] = window
+    return list(contexts.values())
+
+
+def local_moderation(product_json):
+    """
+    Score product details against the local term list.
+
+    Returns:
+        tuple: (decision, score, matched_terms) where decision is "allow" when
+               nothing matched, "deny" when a term weighted DENY_SCORE matched
+               and "escalate" otherwise. Lower-weighted terms never deny on
+               their own, however many of them match.
+    """
+    matched = _matched_terms(_moderation_text(product_json))
+    score = sum(TERM_WEIGHTS[term] for term in matched)
+    if any(TERM_WEIGHTS[term] >= DENY_SCORE for term in matched):
+        return "deny", score, sorted(matched)
+    if score > 0:
+        return "escalate", score, sorted(matched)
+    return "allow", score, []
+
+
+def remote_moderation(product_json, contexts=None):
     """
     Use the Mistral Moderation API to check if the product details are appropriate.
 
     Parameters:
         product_json (dict): JSON object containing product details.
+        contexts (list): Excerpts around locally matched terms, included
+                         because the product details are truncated.
 
     Returns:
-        dict: A dictionary containing moderation results with validated status.
-              Example:
-              {
-                  "validated": True,
-                  "categories": {
-                      "sexual": False,
-                      "hate_and_discrimination": False,
-                      ...
-                  },
-                  "category_scores": {
-                      "sexual": 0.0001,
-                      "hate_and_discrimination": 0.0002,
-                      ...
-                  }
-              }
+        dict: {"inappropriate_content": bool} on success, or a dictionary with
+              an "error" key if the request or response parsing failed.
     """
+    excerpts = ""
+    if contexts:
+        excerpts = "\n                Excerpts: " + " | ".join(
+            f'"...{context}..."' for context in contexts
+        )
+
     # Prepare the moderation payload
     payload = {
         "model": "mistral-moderation-latest",
         "input": [
             {
                 "role": "user",
-                "content": f"""Product details: {product_json}.
+                "content": f"""Product details: {shape_product_payload(product_json)}.{excerpts}
                 Check if the product details comply with platform guidelines and moderation standards.""",
             }
         ],
@@ -46,12 +194,14 @@ def check_product_moderation(product_json):
 
     try:
         # Make the API request
+        started = time.monotonic()
         response = requests.post(
             "https://api.mistral.ai/v1/chat/moderations",
             headers=headers,
             json=payload,
             timeout=10,  # Timeout for the request
         )
+        record_usage("moderation", response, started)
         response.raise_for_status()  # Raise an exception for non-2xx responses
     except requests.RequestException as e:
         print(f"Error during moderation: {e}")
@@ -64,10 +214,7 @@ def check_product_moderation(product_json):
         # Extract categories and scores
         results = response_json.get("results", [])
         if not results:
-            return {
-                "inappropriate_content": False,
-                "error": "Invalid API response format",
-            }
+            return {"error": "Invalid API response format"}
 
         categories = results[0].get("categories", {})
 
@@ -87,12 +234,81 @@ def check_product_moderation(product_json):
             categories.get(category, False) for category in relevant_categories
         )
 
+        return {"inappropriate_content": inappropriate_content}
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"Error parsing moderation response: {e}")
+        return {"error": "Failed to parse API response"}
+
+
+def check_product_moderation(product_json):
+    """
+    Check if the product details are appropriate.
+
+    Clear cases are decided by the local term list; only ambiguous products,
+    plus a MODERATION_ESCALATION_RATE sample of locally allowed ones, are sent
+    to the Mistral Moderation API. Escalated products fail closed if the remote
+    check cannot be completed.
+
+    Parameters:
+        product_json (dict): JSON object containing product details.
+
+    Returns:
+        dict: A dictionary containing the moderation result.
+              Example:
+              {
+                  "inappropriate_content": False,
+                  "tier": "local"
+              }
+              An "error" key is added when the product was rejected because
+              the remote check failed or the content was flagged.
+    """
+    # Reuse a verdict already computed by any worker for identical details;
+    # keyed on the full text, not the truncated prompt payload, so content
+    # appended past the truncation point never reuses another verdict
+    cache_key = verdict_key("moderation", _moderation_text(product_json))
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    decision, score, matched = local_moderation(product_json)
+
+    if decision == "deny":
+        _count("local_deny")
         moderation_result = {
-            "inappropriate_content": inappropriate_content,
+            "inappropriate_content": True,
+            "tier": "local",
+            "error": f"Inappropriate Content ({', '.join(matched)})",
         }
+    elif decision == "allow" and random.random() >= settings.MODERATION_ESCALATION_RATE:
+        _count("local_allow")
+        moderation_result = {"inappropriate_content": False, "tier": "local"}
+    else:
+        if decision == "allow":
+            # Audit sample of a local allow; keep the local verdict on failure
+            _count("local_allow")
+            _count("sampled")
+            contexts = None
+        else:
+            _count("escalated")
+            # The prompt payload is truncated; show the model where each
+            # matched term appears so terms past the cut can be cleared
+            contexts = _term_contexts(_moderation_text(product_json))
 
-        print(moderation_result)  # Debug: Log the result
-        return moderation_result
-    except (KeyError, TypeError) as e:
-        print(f"Error parsing moderation response: {e}")
-        return {"validated": False, "error": "Failed to parse API response"}
+        remote_result = remote_moderation(product_json, contexts)
+        if "error" in remote_result:
+            _count("remote_failures")
+            if decision == "allow":
+                return {"inappropriate_content": False, "tier": "local"}
+            return {
+                "inappropriate_content": True,
+                "tier": "remote",
+                "error": f"Moderation unavailable: {remote_result['error']}",
+            }
+        moderation_result = {
+            "inappropriate_content": remote_result["inappropriate_content"],
+            "tier": "remote",
+        }
+
+    print(moderation_result)  # Debug: Log the result
+    cache.set(cache_key, moderation_result, ttl=settings.VERDICT_CACHE_TTL)
+    return moderation_result
@@ -0,0 +1,173 @@
+import json
+import math
+from app.core.config import settings
+
+# Fields that never help the model judge a product and can be huge
+OMITTED_FIELDS = {"id", "_id", "image", "image_hash"}
+
+# Top-level fields kept first when the budget forces fields to be dropped;
+# any other field follows, and entries of nested objects such as
+# dynamic_attributes come last, in their original order
+PRIORITY_FIELDS = [
+    "product_name",
+    "category",
+    "brand",
+    "colour",
+    "color",
+    "price",
+    "amount_in_stock",
+    "product_description",
+    "dimensions",
+    "box_includes",
+]
+
+# Characters reserved per string value when deciding which entries fit
+MIN_VALUE_CHARS = 32
+
+# Longer keys (e.g. in dynamic_attributes) are truncated
+MAX_KEY_CHARS = 64
+
+ELLIPSIS = "..."
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count for budgeting; Mistral tokenizers average about four
+    characters per token on English product text.
+    """
+    return math.ceil(len(text) / 4)
+
+
+def truncate_text(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    if max_chars < len(ELLIPSIS):
+        return text[:max_chars]
+    return text[: max_chars - len(ELLIPSIS)] + ELLIPSIS
+
+
+def _encoded_len(text: str) -> int:
+    # Length of the string body once JSON-escaped, without the quotes
+    return len(json.dumps(text, ensure_ascii=False)) - 2
+
+
+def _fit(text: str, max_len: int) -> str:
+    """
+    Truncate text so its JSON-escaped body is at most max_len characters.
+    """
+    if _encoded_len(text) <= max_len:
+        return text
+    if max_len < len(ELLIPSIS):
+        return ""
+    cut = max_len - len(ELLIPSIS)
+    # Escapes make the body longer than the raw text; shrink until it fits
+    while cut > 0 and _encoded_len(text[:cut]) > cut:
+        cut -= _encoded_len(text[:cut]) - cut
+    while cut > 0 and _encoded_len(text[:cut]) + len(ELLIPSIS) > max_len:
+        cut -= 1
+    return text[:cut] + ELLIPSIS
+
+
+def _leaf(value):
+    # Strings stay truncatable; anything nested deeper is flattened to text
+    if isinstance(value, str) or value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, (list, tuple)) and all(isinstance(item, str) for item in value):
+        return ", ".join(value)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _keep(key, value) -> bool:
+    return key not in OMITTED_FIELDS and not (
+        isinstance(value, str) and value.startswith("data:")
+    )
+
+
+def _entries(product_json: dict):
+    """
+    Flatten product details into (parent, key, value) entries in the order
+    they are kept when the budget is tight. parent is None for top-level
+    fields and the field name for entries of a nested object.
+    """
+    top = [(key, value) for key, value in product_json.items() if _keep(key, value)]
+    rank = {field: i for i, field in enumerate(PRIORITY_FIELDS)}
+    top.sort(key=lambda item: rank.get(item[0], len(rank)))
+    scalars, nested = [], []
+    for key, value in top:
+        key = str(key)[:MAX_KEY_CHARS]
+        if isinstance(value, dict):
+            nested.extend(
+                (key, str(child_key)[:MAX_KEY_CHARS], _leaf(child))
+                for child_key, child in value.items()
+                if _keep(child_key, child)
+            )
+        else:
+            scalars.append((None, key, _leaf(value)))
+    return scalars + nested
+
+
+def shape_product_payload(product_json, token_budget: int = None) -> str:
+    """
+    Serialise product details compactly for a Mistral prompt.
+
+    Images, identifiers and data URIs are dropped and values are cut to
+    PROMPT_MAX_VALUE_CHARS. If the result would still exceed the token
+    budget, the lowest-priority entries (nested dynamic attributes first)
+    are dropped and the remaining characters are shared out across the
+    string values, so the output always fits the budget.
+
+    Parameters:
+        product_json (dict): The product details.
+        token_budget (int): Maximum estimated tokens; defaults to PROMPT_TOKEN_BUDGET.
+
+    Returns:
+        str: Compact JSON of the relevant product fields.
+    """
+    token_budget = token_budget or settings.PROMPT_TOKEN_BUDGET
+    max_chars = token_budget * 4
+    max_value = settings.PROMPT_MAX_VALUE_CHARS
+
+    # Admit entries in priority order while their keys, punctuation and a
+    # minimal share of their value still fit. Lengths are upper bounds: every
+    # entry is charged a separating comma.
+    used = 2  # {}
+    parents = set()
+    admitted = []
+    for parent, key, value in _entries(product_json):
+        cost = _encoded_len(key) + 3 + 1  # "key": plus comma
+        if parent is not None and parent not in parents:
+            cost += _encoded_len(parent) + 3 + 2 + 1  # "parent":{} plus comma
+        if isinstance(value, str):
+            cost += 2 + min(_encoded_len(value), MIN_VALUE_CHARS, max_value)
+        else:
+            cost += len(json.dumps(value))
+        if used + cost > max_chars:
+            continue
+        used += cost
+        parents.add(parent)
+        admitted.append((parent, key, value))
+
+    # Share the remaining characters across string values: short values keep
+    # their full length and the rest split what is left equally
+    strings = sorted(
+        (i for i, entry in enumerate(admitted) if isinstance(entry[2], str)),
+        key=lambda i: _encoded_len(admitted[i][2]),
+    )
+    available = max_chars - used + sum(
+        min(_encoded_len(admitted[i][2]), MIN_VALUE_CHARS, max_value) for i in strings
+    )
+    limits = {}
+    for position, i in enumerate(strings):
+        share = available // (len(strings) - position)
+        limits[i] = min(_encoded_len(admitted[i][2]), share, max_value)
+        available -= limits[i]
+
+    shaped = {}
+    for i, (parent, key, value) in enumerate(admitted):
+        if i in limits:
+            value = _fit(value, limits[i])
+        if parent is None:
+            shaped[key] = value
+        else:
+            shaped.setdefault(parent, {})[key] = value
+    return json.dumps(shaped, separators=(",", ":"), ensure_ascii=False)
@@ -0,0 +1,286 @@
+import hashlib
+import re
+import threading
+import zlib
+import numpy as np
+from bson import ObjectId
+from app.core.config import settings
+from app.services.cache import cache
+from app.services.cloudinary import base64_to_image
+
+# Dimension of the hashed feature space. Each indexed product costs
+# N_FEATURES * 4 bytes per worker (8 KB), which keeps a 10k-product catalogue
+# around 80 MB while leaving collisions too rare to matter for near-duplicates
+N_FEATURES = 2**11
+
+# Text fields used for similarity and how much each one counts
+FIELD_WEIGHTS = {
+    "product_name": 2.0,
+    "brand": 1.0,
+    "product_description": 1.0,
+}
+
+WORD_RE = re.compile(r"\w+")
+
+# Shared log of catalogue writes that other workers replay into their copy of
+# the index; a worker that falls further behind than this rebuilds instead
+CHANGE_LOG_KEY = "catalogue:log"
+VERSION_KEY = "catalogue:version"
+CHANGE_LOG_SIZE = 1000
+
+
+def _features(text: str):
+    """
+    Word unigrams plus character 3-grams of each word, so small spelling and
+    wording changes between listings still overlap.
+    """
+    for word in WORD_RE.findall(text.lower()):
+        yield f"w:{word}"
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            yield f"c:{padded[i:i + 3]}"
+
+
+def vectorize(product: dict) -> np.ndarray:
+    """
+    Hashed n-gram vector of a product's text fields, L2-normalised so a dot
+    product between two vectors is their cosine similarity.
+    """
+    vector = np.zeros(N_FEATURES, dtype=np.float32)
+    for field, weight in FIELD_WEIGHTS.items():
+        text = product.get(field) or ""
+        counts = {}
+        for feature in _features(text):
+            index = zlib.crc32(feature.encode("utf-8")) % N_FEATURES
+            counts[index] = counts.get(index, 0) + 1
+        if counts:
+            indices = np.fromiter(counts.keys(), dtype=np.int64)
+            # Sublinear term frequency keeps long descriptions from dominating
+            values = np.log1p(np.fromiter(counts.values(), dtype=np.float32))
+            np.add.at(vector, indices, weight * values)
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+def image_hash(image: str):
+    """
+    Hash used to spot a reused product image. Base64 data URIs are hashed on
+    their decoded bytes, so the same picture uploaded twice matches. Links
+    are not downloaded and are hashed as URL strings, so they only match an
+    identical link; the same picture under two different links never matches.
+    """
+    if not image:
+        return None
+    try:
+        if image.startswith("data:image"):
+            return hashlib.sha256(base64_to_image(image)).hexdigest()
+        return hashlib.sha256(image.encode("utf-8")).hexdigest()
+    except Exception as e:
+        print(f"Error hashing product image: {e}")
+        return None
+
+
+class SimilarityIndex:
+    """
+    In-memory index of the catalogue for near-duplicate lookups.
+
+    Product vectors are stored as rows of one dense matrix so a top-k query is a
+    single matrix-vector product. The index is built lazily from Mongo and kept
+    up to date incrementally on insert, update and delete. Each worker holds its
+    own copy; writes are appended to a change log in the shared cache, and a
+    worker replays the entries it has not seen before its next lookup.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._matrix = np.zeros((0, N_FEATURES), dtype=np.float32)
+        self._size = 0
+        self._ids = []
+        self._rows = {}
+        self._image_hashes = {}
+        self._hash_of = {}
+        self._built = False
+        self._version = None
+
+    def _reset(self, capacity: int = 0):
+        self._matrix = np.zeros((capacity, N_FEATURES), dtype=np.float32)
+        self._size = 0
+        self._ids = []
+        self._rows = {}
+        self._image_hashes = {}
+        self._hash_of = {}
+
+    def _add(self, product_id: str, product: dict, img_hash: str = None):
+        if product_id in self._rows:
+            self._remove(product_id)
+        if self._size == self._matrix.shape[0]:
+            # Grow geometrically so inserts stay amortised O(1)
+            grown = np.zeros(
+                (max(16, self._matrix.shape[0] * 2), N_FEATURES), dtype=np.float32
+            )
+            grown[: self._size] = self._matrix[: self._size]
+            self._matrix = grown
+        self._matrix[self._size] = vectorize(product)
+        self._rows[product_id] = self._size
+        self._ids.append(product_id)
+        self._size += 1
+        if img_hash:
+            self._image_hashes.setdefault(img_hash, set()).add(product_id)
+            self._hash_of[product_id] = img_hash
+
+    def _remove(self, product_id: str):
+        row = self._rows.pop(product_id, None)
+        if row is None:
+            return
+        # Move the last row into the freed slot to keep the matrix dense
+        last = self._size - 1
+        if row != last:
+            moved_id = self._ids[last]
+            self._matrix[row] = self._matrix[last]
+            self._ids[row] = moved_id
+            self._rows[moved_id] = row
+        self._ids.pop()
+        self._matrix[last] = 0
+        self._size -= 1
+        img_hash = self._hash_of.pop(product_id, None)
+        if img_hash:
+            self._image_hashes[img_hash].discard(product_id)
+
+    def _rebuild(self, collection):
+        projection = {field: 1 for field in FIELD_WEIGHTS}
+        projection["image_hash"] = 1
+        documents = list(collection.find({}, projection))
+        self._reset(capacity=len(documents))
+        for document in documents:
+            self._add(str(document["_id"]), document, document.get("image_hash"))
+        self._built = True
+
+    def _replay(self, collection, entries):
+        # Apply other workers' writes in order; added products are fetched in
+        # one query by id rather than rescanning the catalogue
+        latest = {}
+        for entry in entries:
+            latest[entry["id"]] = entry
+        added = [
+            ObjectId(product_id)
+            for product_id, entry in latest.items()
+            if entry["op"] == "add"
+        ]
+        projection = {field: 1 for field in FIELD_WEIGHTS}
+        projection["image_hash"] = 1
+        documents = {
+            str(document["_id"]): document
+            for document in collection.find({"_id": {"$in": added}}, projection)
+        } if added else {}
+        for product_id, entry in latest.items():
+            document = documents.get(product_id)
+            if entry["op"] == "add" and document:
+                self._add(product_id, document, document.get("image_hash"))
+            else:
+                self._remove(product_id)
+
+    def ensure_current(self, collection):
+        """
+        Build the index on first use, or replay the writes other workers made
+        since this copy was last synced. Rebuilds only if the change log no
+        longer reaches back far enough.
+        """
+        version = cache.get(VERSION_KEY) or 0
+        with self._lock:
+            if self._built and self._version == version:
+                return
+            log = cache.get(CHANGE_LOG_KEY) if self._built else None
+            if log is not None:
+                entries = [
+                    entry for entry in log["entries"] if entry["version"] > self._version
+                ]
+                if not entries:
+                    return
+                if entries[0]["version"] == self._version + 1:
+                    self._replay(collection, entries)
+                    self._version = entries[-1]["version"]
+                    return
+            # Read the version before scanning so writes during the scan replay
+            version = cache.get(VERSION_KEY) or 0
+            self._rebuild(collection)
+            self._version = version
+
+    def _log_change(self, op: str, product_id: str):
+        # Caller holds the lock. Appends to the shared change log, and returns
+        # True if this copy was current so the write can be applied directly.
+        def append(log):
+            log = log or {"version": 0, "entries": []}
+            version = log["version"] + 1
+            entries = log["entries"][-(CHANGE_LOG_SIZE - 1):]
+            entries.append({"version": version, "op": op, "id": product_id})
+            return {"version": version, "entries": entries}
+
+        log = cache.update(CHANGE_LOG_KEY, append, ttl=0)
+        if log is None:
+            self._built = False
+            return False
+        # Concurrent writers may finish out of order; the version only moves up
+        cache.update(VERSION_KEY, lambda current: max(current or 0, log["version"]), ttl=0)
+        if self._built and self._version == log["version"] - 1:
+            self._version = log["version"]
+            return True
+        # Other workers wrote first; their entries and ours replay on next lookup
+        return False
+
+    def add(self, product_id: str, product: dict, img_hash: str = None):
+        with self._lock:
+            if self._log_change("add", product_id):
+                self._add(product_id, product, img_hash)
+
+    def remove(self, product_id: str):
+        with self._lock:
+            if self._log_change("remove", product_id):
+                self._remove(product_id)
+
+    def query(self, product: dict, k: int = 5, img_hash: str = None, exclude: str = None):
+        """
+        Return up to k catalogue entries most similar to product as a list of
+        {"id", "score", "image_match"} dicts, best first. Entries sharing the
+        same image hash always rank first with a score of 1.0.
+        """
+        with self._lock:
+            if self._size == 0:
+                return []
+            scores = self._matrix[: self._size] @ vectorize(product)
+            image_matches = set(self._image_hashes.get(img_hash, ())) if img_hash else set()
+            for product_id in image_matches:
+                scores[self._rows[product_id]] = 1.0
+            if exclude in self._rows:
+                scores[self._rows[exclude]] = -1.0
+            k = min(k, self._size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                {
+                    "id": self._ids[row],
+                    "score": round(float(scores[row]), 4),
+                    "image_match": self._ids[row] in image_matches,
+                }
+                for row in top
+                if scores[row] > 0
+            ]
+
+
+index = SimilarityIndex()
+
+
+def find_duplicates(collection, product: dict, img_hash: str = None, exclude: str = None):
+    """
+    Catalogue entries that look like duplicates of product: same image, or text
+    similarity at or above DUPLICATE_SIMILARITY_THRESHOLD.
+    """
+    index.ensure_current(collection)
+    matches = index.query(product, k=5, img_hash=img_hash, exclude=exclude)
+    return [
+        match
+        for match in matches
+        if match["image_match"]
+        or match["score"] >= settings.DUPLICATE_SIMILARITY_THRESHOLD
+    ]
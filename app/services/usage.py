@@ -0,0 +1,52 @@
+import time
+from app.services.cache import cache
+
+# Mistral call sites tracked for cost and latency
+USAGE_ENDPOINTS = [
+    "validation",
+    "moderation",
+    "instagram_description",
+    "instagram_attributes",
+]
+
+USAGE_FIELDS = ["calls", "prompt_tokens", "completion_tokens", "total_tokens", "latency_ms"]
+
+
+def record_usage(endpoint: str, response, started: float):
+    """
+    Add one Mistral call to the shared per-endpoint counters.
+
+    Parameters:
+        endpoint (str): One of USAGE_ENDPOINTS.
+        response (requests.Response): The Mistral response, successful or not.
+        started (float): time.monotonic() taken just before the request.
+    """
+    try:
+        latency_ms = int((time.monotonic() - started) * 1000)
+        try:
+            usage = response.json().get("usage") or {}
+        except ValueError:
+            usage = {}
+        cache.incr(f"usage:{endpoint}:calls")
+        cache.incr(f"usage:{endpoint}:latency_ms", latency_ms)
+        for field in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            if usage.get(field):
+                cache.incr(f"usage:{endpoint}:{field}", int(usage[field]))
+    except Exception as e:
+        print(f"Error recording Mistral usage for {endpoint}: {e}")
+
+
+def get_usage_stats():
+    """
+    Return token usage and latency per Mistral endpoint, across all workers.
+    """
+    stats = {}
+    for endpoint in USAGE_ENDPOINTS:
+        counters = {
+            field: cache.get(f"usage:{endpoint}:{field}") or 0 for field in USAGE_FIELDS
+        }
+        counters["avg_latency_ms"] = (
+            round(counters["latency_ms"] / counters["calls"]) if counters["calls"] else 0
+        )
+        stats[endpoint] = counters
+    return stats
@@ -1,6 +1,10 @@
 import requests
 from app.core.config import settings
+from app.services.cache import cache, verdict_key
+from app.services.payload import shape_product_payload
+from app.services.usage import record_usage
 import json
+import time
 
 # Load the Mistral API key from settings
 mistral_api_key = settings.MISTRAL_API_KEY
@@ -20,6 +24,15 @@ def check_product_details(product_json):
         dict: A dictionary containing the validation result.
               Example: {"validated": True} or {"validated": False}.
     """
+    # Only the relevant fields are sent, trimmed to the prompt token budget
+    product_text = shape_product_payload(product_json)
+
+    # Reuse a verdict already computed by any worker for identical details
+    cache_key = verdict_key("validation", product_text)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     # Prepare the request payload
     payload_attributes = {
         "model": "mistral-large-latest",
@@ -27,7 +40,7 @@ def check_product_details(product_json):
             {
                 "role": "user",
                 "content": f"""
-                Product description: {product_json}
+                Product description: {product_text}
                 Check if the product details are correct and not fraudulent.
                 Respond with the attributes in JSON format:
                 {{
@@ -41,12 +54,14 @@ def check_product_details(product_json):
 
     try:
         # Make the API request to Mistral
+        started = time.monotonic()
         response = requests.post(
             "https://api.mistral.ai/v1/chat/completions",
             headers=headers,
             json=payload_attributes,
             timeout=10  # Add a timeout to avoid hanging requests
         )
+        record_usage("validation", response, started)
         response.raise_for_status()  # Raise an HTTPError for non-200 status codes
     except requests.RequestException as e:
         # Log and handle any request exceptions
@@ -72,6 +87,7 @@ def check_product_details(product_json):
         
         ret_json = {"validated": validated}
         print(ret_json)  # Debug: Log the result
+        cache.set(cache_key, ret_json, ttl=settings.VERDICT_CACHE_TTL)
         return ret_json
     except (ValueError, KeyError, TypeError) as e:
         # Handle JSON parsing errors or missing data
@@ -0,0 +1,25 @@
+import multiprocessing
+import os
+
+# Multi-process serving: gunicorn supervises several uvicorn workers so one slow
+# Mistral call only blocks the worker handling it.
+# Start with: gunicorn -c gunicorn.conf.py app.main:app
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(
+    os.environ.get("WEB_CONCURRENCY", min(multiprocessing.cpu_count() * 2 + 1, 4))
+)
+
+# Import the app once in the master so workers fork with modules already loaded
+preload_app = os.environ.get("PRELOAD_APP", "true").lower() == "true"
+
+# Graceful restarts: in-flight requests get this long to finish on HUP/TERM
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", 30))
+timeout = int(os.environ.get("WORKER_TIMEOUT", 120))
+keepalive = int(os.environ.get("KEEPALIVE", 5))
+
+# Recycle workers periodically to bound memory growth
+max_requests = int(os.environ.get("MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("MAX_REQUESTS_JITTER", 100))
+
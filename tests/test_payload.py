@@ -0,0 +1,60 @@
+import json
+import time
+from app.services.payload import estimate_tokens, shape_product_payload
+
+BUDGET = 1500
+
+
+def _product(attributes):
+    return {
+        "product_name": "Walnut desk",
+        "category": "Furniture",
+        "brand": "Oakline",
+        "price": 12000,
+        "image": "data:image/png;base64,AAAA",
+        "dynamic_attributes": attributes,
+    }
+
+
+def test_many_short_attributes_fit_budget():
+    attributes = {f"attribute_{i}": f"value {i}" for i in range(5000)}
+    started = time.monotonic()
+    shaped = shape_product_payload(_product(attributes), token_budget=BUDGET)
+    assert time.monotonic() - started < 1
+    assert estimate_tokens(shaped) <= BUDGET
+    result = json.loads(shaped)
+    # Top-level fields survive; lowest-priority attributes are dropped
+    assert result["product_name"] == "Walnut desk"
+    assert "image" not in result
+    assert "attribute_0" in result["dynamic_attributes"]
+    assert "attribute_4999" not in result["dynamic_attributes"]
+
+
+def test_many_long_attributes_fit_budget():
+    attributes = {f"attribute_{i}": "x" * 2000 for i in range(1000)}
+    started = time.monotonic()
+    shaped = shape_product_payload(_product(attributes), token_budget=BUDGET)
+    assert time.monotonic() - started < 1
+    assert estimate_tokens(shaped) <= BUDGET
+    result = json.loads(shaped)
+    assert result["brand"] == "Oakline"
+    assert result["dynamic_attributes"]
+
+
+def test_long_keys_and_escaped_values_fit_budget():
+    attributes = {"k" * 5000 + str(i): '"\n' * 1000 for i in range(50)}
+    shaped = shape_product_payload(_product(attributes), token_budget=100)
+    assert estimate_tokens(shaped) <= 100
+    json.loads(shaped)
+
+
+def test_small_product_is_unchanged():
+    product = _product({"material": "walnut"})
+    result = json.loads(shape_product_payload(product, token_budget=BUDGET))
+    assert result == {
+        "product_name": "Walnut desk",
+        "category": "Furniture",
+        "brand": "Oakline",
+        "price": 12000,
+        "dynamic_attributes": {"material": "walnut"},
+    }